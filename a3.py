@@ -1,29 +1,67 @@
+"""
+Extra Fancy Sokoban, a Tk GUI for the Sokoban model.
+
+Performance note: the hot path is Tk canvas item work and PIL image resizing,
+both in C, with Python overhead only in the per-cell loop of
+FancyGameView.display. Speed ups should come from caching images and
+geometry, redrawing only changed cells, and not recreating widgets. There is
+no numeric inner loop, so JIT compilers such as Numba won't help here.
+"""
 import tkinter as tk
-from tkinter import messagebox, filedialog
+from tkinter import messagebox
+from functools import partial
 from typing import Callable
-from model import SokobanModel, Tile, Entity
-from a2_support import *
-from a3_support import *
+from PIL import Image, ImageTk
+from model import SokobanModel
+from a2_support import (Grid, Entities, Position, WALL, FLOOR, GOAL,
+                        FILLED_GOAL, CRATE, PLAYER, STRENGTH_POTION,
+                        MOVE_POTION, FANCY_POTION)
+from a3_support import (MAZE_SIZE, SHOP_WIDTH, BANNER_HEIGHT, STATS_HEIGHT,
+                        TITLE_FONT, CRATE_FONT, get_image, AbstractGrid)
 
 COIN = '$'
 
+_IMAGE_PATHS = {
+    FLOOR: "images/Floor.png",
+    COIN: "images/$.png",
+    CRATE: "images/C.png",
+    GOAL: "images/G.png",
+    FILLED_GOAL: "images/X.png",
+    WALL: "images/W.png",
+    PLAYER: "images/P.png",
+    MOVE_POTION: "images/M.png",
+    STRENGTH_POTION: "images/S.png",
+    FANCY_POTION: "images/F.png"
+}
+
+_POTION_NAME = {
+    "S": "Strength Potion",
+    "M": "Move Potion",
+    "F": "Fancy Potion",
+}
+
+_ID_TO_NAME = {
+    "S": STRENGTH_POTION,
+    "M": MOVE_POTION,
+    "F": FANCY_POTION,
+}
+
+_MOVE_KEYS = {
+    "up": "w",
+    "down": "s",
+    "left": "a",
+    "right": "d",
+    "w": "w",
+    "a": "a",
+    "s": "s",
+    "d": "d",
+}
+
 def get_image_path(item) -> str:
     """
     Returns the file path for the selected image via dictionary.
     """
-    image_paths = {
-        FLOOR: "images/Floor.png",
-        COIN: "images/$.png",
-        CRATE: "images/C.png",
-        GOAL: "images/G.png",
-        FILLED_GOAL: "images/X.png",
-        WALL: "images/W.png",
-        PLAYER: "images/P.png",
-        MOVE_POTION: "images/M.png",
-        STRENGTH_POTION: "images/S.png",
-        FANCY_POTION: "images/F.png"
-    }
-    return image_paths.get(item)
+    return _IMAGE_PATHS.get(item)
 
 class FancyGameView(AbstractGrid):
     """
@@ -35,59 +73,119 @@ class FancyGameView(AbstractGrid):
                  size: tuple[int, int], **kwargs) -> None:
         """
         Sets up FancyGameView to inherit appropriate size and dimensions from
-        abstract_grid. Also creates an image cache with a dictionary.
+        abstract_grid. Also creates a cache of resized sprites with a
+        dictionary per cell size, a cache of each cell's blended image for the
+        current cell size, and records of what each cell last displayed for
+        incremental redraws. Every sprite is loaded up front so the first move
+        doesn't stall.
         """
         super().__init__(master, dimensions, size, **kwargs)
-        self._image_storage_cache = {}
+        self._image_storage_cache: dict[tuple[int, int],
+                                        dict[str, Image.Image]] = {}
+        self._cell_size = self.get_cell_size()
+        self._composite_cache: dict[tuple[str, ...],
+                                    ImageTk.PhotoImage] = {}
+        self._prev_state: dict[Position, tuple] = {}
+        self._midpoints = self._build_midpoints()
+
+        for item_type in _IMAGE_PATHS:
+            self._get_cell_image((item_type,))
+
+    def _build_midpoints(self) -> list[list[tuple[int, int]]]:
+        """Returns the midpoint of every cell, indexed by row then column."""
+        rows, cols = self._dimensions
+        return [[self.get_midpoint((y, x)) for x in range(cols)]
+                for y in range(rows)]
+
+    def _get_sprite(self, item_type: str) -> Image.Image:
+        """Returns the sprite for an item type resized to the cell size."""
+        size_cache = self._image_storage_cache.setdefault(self._cell_size, {})
+        sprite = size_cache.get(item_type)
+        if sprite is None:
+            sprite = Image.open(get_image_path(item_type))
+            sprite = sprite.resize(self._cell_size).convert("RGBA")
+            size_cache[item_type] = sprite
+        return sprite
+
+    def _get_cell_image(self, layers: tuple[str, ...]) -> ImageTk.PhotoImage:
+        """
+        Returns a single image of the sprites for layers blended bottom to
+        top, at the current cell size. Each combination is blended only once.
+        """
+        image = self._composite_cache.get(layers)
+        if image is None:
+            blended = self._get_sprite(layers[0])
+            for layer in layers[1:]:
+                blended = Image.alpha_composite(blended,
+                                                self._get_sprite(layer))
+            image = ImageTk.PhotoImage(image = blended)
+            self._composite_cache[layers] = image
+        return image
 
     def display(self, maze: Grid,
                 entities: Entities, player_position: Position):
         """
-        Clears game view, then places images for tiles and instances.
+        Places images for tiles and instances, only redrawing the cells whose
+        contents have changed since the previous display.
         Floor tiles are assumed to be underneath all entities.
+        The maze and entities are shared with the model and only read here.
         """
-        self.clear()  # Clears View for image placement
-
+        cell_size = self.get_cell_size()
+        if cell_size != self._cell_size:
+            self._composite_cache.clear()
+            self._cell_size = cell_size
+            self._midpoints = self._build_midpoints()
+            self.clear()  # Every cell must be redrawn at the new size
+            self._prev_state = {}
+
+        new_state = {}
         for y, row in enumerate(maze):
             for x, item in enumerate(row):
-                y_x = (y, x)
-
-                if isinstance(item, Tile):
-                    path = get_image_path(item.get_type())
-                    tile_image = get_image(path, self.get_cell_size(),
-                                           self._image_storage_cache)
-
-                    self.create_image(self.get_midpoint(y_x),
-                                      image = tile_image)
-
-                if isinstance(item, Entity):
-                    path = get_image_path(item.get_type())
-                    entity_image = get_image(path, self.get_cell_size(),
-                                             self._image_storage_cache)
-
-                    self.create_image(self.get_midpoint(y_x),
-                                      image=entity_image)
-                    
-                if y_x in entities:
-                    e = entities[y_x]
-                    path = get_image_path(e.get_type())
-                    ent_image = get_image(path, self.get_cell_size(),
-                                          self._image_storage_cache)
-
-                    self.create_image(self.get_midpoint(y_x),
-                                      image = ent_image)
-                    if e.get_type() == CRATE:
-                        crate_strength = str(e.get_strength())
-                        self.annotate_position(y_x, # Put strength num on crate
-                                               crate_strength, CRATE_FONT)
-
-                if y_x == player_position:
-                    path = get_image_path(PLAYER)
-                    player_image = get_image(path, self.get_cell_size(),
-                                             self._image_storage_cache)
-
-                    self.create_image(self.get_midpoint(y_x),
-                                      image = player_image)
+                # Tiles and entities both expose their type for image lookup
+                new_state[(y, x)] = ((item.get_type(),), None)
+
+        # Entities and the player are few, so overlay them directly
+        for y_x, e in entities.items():
+            layers, _ = new_state[y_x]
+            strength = e.get_strength() if e.get_type() == CRATE else None
+            new_state[y_x] = (layers + (e.get_type(),), strength)
+
+        layers, strength = new_state[player_position]
+        new_state[player_position] = (layers + (PLAYER,), strength)
+
+        for y_x, state in new_state.items():
+            if state != self._prev_state.get(y_x):
+                self._draw_cell(y_x, *state)
+        self._prev_state = new_state
+
+    def _draw_cell(self, position: Position, layers: tuple[str, ...],
+                   strength: int | None) -> None:
+        """
+        Updates the canvas items at position to show a blended image of
+        layers, and the crate strength on top if one is given. Each cell has
+        one image tagged "c{row}_{col}" and strength text tagged
+        "t{row}_{col}", which are reconfigured in place once created.
+        """
+        prev_state = self._prev_state.get(position)
+        prev_strength = prev_state[1] if prev_state is not None else None
+        row, col = position
+        cell_tag, text_tag = f"c{row}_{col}", f"t{row}_{col}"
+        midpoint = self._midpoints[row][col]
+        image = self._get_cell_image(layers)
+
+        if prev_state is not None:
+            self.itemconfigure(cell_tag, image = image)
+        else:
+            self.create_image(midpoint, image = image, tags = (cell_tag,))
+
+        if strength is None:
+            if prev_strength is not None:
+                self.delete(text_tag)
+        elif prev_strength is None:  # Put strength num on crate
+            self.create_text(midpoint, text = str(strength),
+                             font = CRATE_FONT, tags = (text_tag,))
+        else:
+            self.itemconfigure(text_tag, text = str(strength))
 
 
 class FancyStatsView(AbstractGrid):
@@ -147,19 +245,8 @@ class Shop(tk.Frame):
         """
         Creates the shops buyable items for the three potions and puts the
         item names and prices next to a button that can buy the item
-        via lambda callback
+        via partial callback
         """
-        POTION_NAME = {
-            "S": "Strength Potion",
-            "M": "Move Potion",
-            "F": "Fancy Potion",
-        }
-        ITEM_COSTS = {
-            STRENGTH_POTION: 5,
-            MOVE_POTION: 5,
-            FANCY_POTION: 10,
-        }
-        
         # Create a frame for the buyable item
         self.new_item_frame = tk.Frame(self)
         self.new_item_frame.pack(side = tk.TOP, fill = tk.X)
@@ -167,15 +254,15 @@ class Shop(tk.Frame):
         # Create a label for the item name and cost
         self.new_item_label = tk.Label(
             self.new_item_frame,
-            text = f"{POTION_NAME.get(item)}: ${amount}",
+            text = f"{_POTION_NAME.get(item)}: ${amount}",
         )
         self.new_item_label.pack(side = tk.LEFT, fill = tk.BOTH,
                                  expand = tk.TRUE)
 
-        # Create a button for buying the item via lambda callback
+        # Create a button for buying the item via partial callback
         self.buy_item_button = tk.Button(self.new_item_frame,
                                          text = "Buy",
-                                         command = lambda: callback(item))
+                                         command = partial(callback, item))
         self.buy_item_button.pack(side = tk.RIGHT, anchor = tk.E)
         
 
@@ -203,6 +290,13 @@ class FancySokobanView:
                                         size = (450, 450))
         self._game_view.config(width = 450, height = 450)
         self._game_view.pack(fill = tk.BOTH, expand = True)
+
+        # Build shop once, it is placed next to the game by display_shop
+        self._shop_frame = tk.Frame(self.game_shop_frame,
+                                    width = 200, height = 450)
+        self._shop_view = Shop(self._shop_frame)
+        self._shop_view.pack(side = tk.TOP, anchor = tk.NE,
+                             fill = tk.BOTH, expand = True)
         
         # Put stats_view in its own frame at bottom of window
         self.stats_view = FancyStatsView(self.root)
@@ -211,19 +305,14 @@ class FancySokobanView:
 
     def display_game(self, maze: Grid, entities: Entities,
                      player_position: Position) -> None:
-        """Clears and displays game view with current maze configuration."""
-        self._game_view.clear()
+        """Displays game view with current maze configuration."""
         self._game_view.display(maze, entities, player_position)
 
     def display_shop(self) -> None:
-        """Makes shop frame to sit next to Game, and displays Shop."""
-        self._shop_frame = tk.Frame(self.game_shop_frame,
-                                    width = 200, height = 450)
-        self._shop_frame.pack(side = tk.RIGHT, anchor = tk.NE,
-                              fill = tk.BOTH, expand = True)
-        self._shop_view = Shop(self._shop_frame)
-        self._shop_view.pack(side = tk.TOP, anchor = tk.NE,
-                             fill = tk.BOTH, expand = True)
+        """Places shop frame to sit next to Game if not already shown."""
+        if not self._shop_frame.winfo_manager():
+            self._shop_frame.pack(side = tk.RIGHT, anchor = tk.NE,
+                                  fill = tk.BOTH, expand = True)
 
     def display_stats(self, moves: int, strength: int, money: int):
         """Clears and displays current player stats."""
@@ -234,8 +323,12 @@ class FancySokobanView:
                           button_callback: Callable[[str], None] = None):
         """
         Creates items that can be purchased in shop by
-        calling create_buyable_item
+        calling create_buyable_item, replacing any previously created items.
         """
+        for child in self._shop_view.winfo_children():
+            if child is not self._shop_view.shop_title:
+                child.destroy()
+
         for item_id, amount in shop_items.items():
             self._shop_view.create_buyable_item(item_id,
                                                 amount, button_callback)
@@ -253,6 +346,13 @@ class ExtraFancySokoban:
         self._maze_file = maze_file
         self._model = SokobanModel(self._maze_file)
 
+        # Id of the idle callback for a queued redraw, None if none is queued
+        self._pending_redraw = None
+
+        # Banner sits above the game, its cache kept for future rescales
+        self._banner_cache = {}
+        place_banner(self._root, self._banner_cache)
+
         # Size and Dimension
         rows, cols = self._model.get_dimensions()
         width, height = (MAZE_SIZE + SHOP_WIDTH,
@@ -260,16 +360,6 @@ class ExtraFancySokoban:
         self._dimension = (rows, cols)
         self._size = (width, height)
 
-        # Game grid variables
-        self.game_maze = self._model.get_maze()
-        self.game_entity = self._model.get_entities()
-        self.game_player_position = self._model.get_player_position()
-
-        # Game player variables
-        self.player_moves = self._model.get_player_moves_remaining()
-        self.player_strength = self._model.get_player_strength()
-        self.player_money = self._model.get_player_money()
-
         # Shop Variables
         self._shop_items = self._model.get_shop_items()
 
@@ -283,19 +373,10 @@ class ExtraFancySokoban:
 
     def display_game_and_stats(self) -> None:
         """
-        Display game and stats. seperate function for refreshing
+        Display game and stats. Alias of redraw for refreshing
         game view and player stats after successfull attempt move.
         """
-        self.game_maze = self._model.get_maze()
-        self.game_entity = self._model.get_entities()
-        self.game_player_position = self._model.get_player_position()
-
-        self.player_moves = self._model.get_player_moves_remaining()
-        self.player_strength = self._model.get_player_strength()
-        self.player_money = self._model.get_player_money()
-
-        self._view.display_game(self.game_maze, self.game_entity, self.game_player_position)
-        self._view.display_stats(self.player_moves, self.player_strength, self.player_money)
+        self.redraw()
 
     def handle_button_callback(self, item_id) -> None:
         """
@@ -303,44 +384,38 @@ class ExtraFancySokoban:
         purchase from model to ensure player has enough money and passes over
         relevent stats.
         """
-        ID_TO_NAME = {
-            "S": STRENGTH_POTION,
-            "M": MOVE_POTION,
-            "F": FANCY_POTION,
-        }
-        item = ID_TO_NAME.get(item_id)
+        item = _ID_TO_NAME.get(item_id)
         self._model.attempt_purchase(item)
         self.redraw()
 
     def redraw(self) -> None:
-        """Redraws gameplay for attempt move and resetting the game."""
-        self.game_maze = self._model.get_maze()
-        self.game_entity = self._model.get_entities()
-        self.game_player_position = self._model.get_player_position()
-
-        self.player_moves = self._model.get_player_moves_remaining()
-        self.player_strength = self._model.get_player_strength()
-        self.player_money = self._model.get_player_money()
+        """
+        Redraws gameplay for attempt move and resetting the game, reading
+        model state once through a single snapshot. Replaces any queued redraw.
+        """
+        if self._pending_redraw is not None:
+            self._root.after_cancel(self._pending_redraw)
+            self._pending_redraw = None
 
-        self.display_game_and_stats()
+        snap = self._model.snapshot()
+        self._view.display_game(snap['maze'], snap['entities'],
+                                snap['player_position'])
+        self._view.display_stats(snap['moves_remaining'], snap['strength'],
+                                 snap['money'])
 
     def handle_keypress(self, event: tk.Event) -> None:
-        """Converts players keypresses to models attempt move for gameplay."""
-        move = event.keysym
-        move = move.lower()
-        move_to_wasd = {
-            "up": "w",
-            "down": "s",
-            "left": "a",
-            "right": "d",
-        }
-        if move in move_to_wasd:
-            move = move_to_wasd[move]
-            
-        self._model.attempt_move(move)
-        self.redraw() # Redraws game after move completed
+        """
+        Converts players keypresses to models attempt move for gameplay.
+        Keys other than the arrow keys and w, a, s, d are ignored, as are
+        moves the model rejects since they leave the game unchanged.
+        """
+        move = _MOVE_KEYS.get(event.keysym.lower())
+        if move is None or not self._model.attempt_move(move):
+            return
 
+        moves_left = self._model.get_player_moves_remaining()
         if self._model.has_won():
+            self.redraw() # Shows the winning move before asking
             yes_or_no = messagebox.askyesno(message = "You won! Play again?")
             if not yes_or_no:
                 self._root.destroy() # Stops game in player says no
@@ -348,7 +423,8 @@ class ExtraFancySokoban:
                 self._model.reset()
                 self.redraw()
                 
-        elif self._model.get_player_moves_remaining() <= 0:
+        elif moves_left <= 0:
+            self.redraw()
             yes_or_no = messagebox.askyesno(message = "You lost! Play again?")
             if not yes_or_no:
                 self._root.destroy()
@@ -356,6 +432,22 @@ class ExtraFancySokoban:
                 self._model.reset()
                 self.redraw()
 
+        else:
+            self._schedule_redraw() # Redraws game after move completed
+
+    def _schedule_redraw(self) -> None:
+        """
+        Queues a redraw for when Tk is idle, so held down keys that repeat
+        faster than the game can be drawn share a single redraw.
+        """
+        if self._pending_redraw is None:
+            self._pending_redraw = self._root.after_idle(self._flush_redraw)
+
+    def _flush_redraw(self) -> None:
+        """Performs the queued redraw."""
+        self._pending_redraw = None
+        self.display_game_and_stats()
+
     
 def place_banner(root, banner_cache) -> None:
     """Places banner at top of window when starting game."""
@@ -369,18 +461,9 @@ def place_banner(root, banner_cache) -> None:
 def play_game(root: tk.Tk, maze_file: str) -> None:
     """Acts like main() for online testing."""
     root.title("Extra Fancy Sokoban")
-    banner_cache = {}
-    place_banner(root, banner_cache)
     controller = ExtraFancySokoban(root, maze_file)
 
-    root.bind("<Up>", controller.handle_keypress)
-    root.bind("<Down>", controller.handle_keypress)
-    root.bind("<Left>", controller.handle_keypress)
-    root.bind("<Right>", controller.handle_keypress)
-    root.bind("w", controller.handle_keypress)
-    root.bind("a", controller.handle_keypress)
-    root.bind("s", controller.handle_keypress)
-    root.bind("d", controller.handle_keypress)
+    root.bind("<Key>", controller.handle_keypress)
 
     root.mainloop()
 
@@ -317,7 +317,9 @@ class SokobanModel:
         return True
 
     def get_maze(self) -> Grid:
-        """ Returns the maze. """
+        """ Returns the maze. This is the model's own maze rather than a copy,
+            so callers must not modify it.
+        """
         return self._maze
 
     def get_dimensions(self) -> tuple[int, int]:
@@ -347,6 +349,25 @@ class SokobanModel:
         """ Returns the amount of money the player has. """
         return self._player.get_money()
 
+    def snapshot(self) -> dict:
+        """ Returns the state needed to display the game in one call.
+
+        Returns:
+            A dictionary with the maze, entities, player position, and the
+            player's moves remaining, strength and money, under the keys
+            'maze', 'entities', 'player_position', 'moves_remaining',
+            'strength' and 'money' respectively. The maze and entities are
+            the model's own rather than copies, so must not be modified.
+        """
+        return {
+            'maze': self._maze,
+            'entities': self._entities,
+            'player_position': self._player_position,
+            'moves_remaining': self._player.get_moves_remaining(),
+            'strength': self._player.get_strength(),
+            'money': self._player.get_money(),
+        }
+
     def undo_move(self) -> None:
         """ Undoes the last valid move made by the player. """
         self._maze = self._last_state['maze']